@@ -0,0 +1,56 @@
+"""
+Builds tickers.pkl, the set of US-listed ticker symbols that main.py checks before calling Yahoo.
+Downloads the NASDAQ Trader symbol directories and pickles the symbols as a frozenset.
+Run by the devcontainer setup, and by main.py at startup when the file is missing or stale.
+
+Usage: python build_tickers.py
+"""
+import pickle
+import urllib.request
+from pathlib import Path
+
+# Symbol directories published by NASDAQ Trader, with the name of each file's symbol column
+SYMBOL_FILES = {
+    "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt": "Symbol",
+    "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt": "ACT Symbol",
+}
+OUTPUT_PATH = Path(__file__).with_name("tickers.pkl")
+
+
+def fetch_symbols(url: str, column: str, timeout: float = 30) -> set[str]:
+    """Downloads a pipe-delimited symbol directory and returns its non-test symbols."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        lines = response.read().decode("utf-8").splitlines()
+
+    header = lines[0].split("|")
+    symbol_index = header.index(column)
+    test_index = header.index("Test Issue")
+    symbols = set()
+    for line in lines[1:]:
+        # The last line is a "File Creation Time" footer rather than a listing
+        if line.startswith("File Creation Time"):
+            continue
+        fields = line.split("|")
+        if len(fields) != len(header) or fields[test_index] == "Y":
+            continue
+        symbols.add(fields[symbol_index].upper())
+    return symbols
+
+
+def build(timeout: float = 30) -> frozenset:
+    """Downloads every symbol directory, writes tickers.pkl and returns the symbol set."""
+    tickers = set()
+    for url, column in SYMBOL_FILES.items():
+        tickers |= fetch_symbols(url, column, timeout)
+    tickers = frozenset(tickers)
+    OUTPUT_PATH.write_bytes(pickle.dumps(tickers))
+    return tickers
+
+
+def main():
+    tickers = build()
+    print(f"Wrote {len(tickers)} tickers to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
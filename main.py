@@ -1,13 +1,26 @@
 import streamlit as st
-import json
-import requests # For making HTTP requests to the Gemini API
+import orjson # For fast JSON encoding and decoding
+import httpx # For making async HTTP requests to the Gemini API
 import os # For accessing environment variables
-from dotenv import load_dotenv # For loading environment variables from .env file
-import yfinance as yf # For fetching stock data
 import asyncio # For running async functions
+import threading # For hosting the background event loop
+import time # For bucketing cache keys by minute
+import functools # For memoizing small pure helpers
+import math # For spotting missing (NaN) price bar values
+import pickle # For loading the prebuilt ticker list
+from pathlib import Path # For transcript file paths
+import build_tickers # For refreshing the local ticker list
+import uuid # For naming per-session transcript files
+import diskcache # For persisting fetched quotes on disk
+import cachetools # For the short-lived response cache
+import gzip # For compressing large request bodies
+import logging # For debug measurements
+from stock_tools import (
+    PRICE_KEYWORDS, STOCK_KEYWORDS, fetch_many, find_tickers, has_stock_exchange, is_known_ticker,
+    is_listed, is_self_contained, mentions_any, trim_history
+)
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Define the agent's properties (simulated)
 AGENT_NAME = "Stock_Market_Assistant"
@@ -16,11 +29,16 @@ AGENT_DESCRIPTION = "A helpful stock market assistant that can fetch real-time s
 AGENT_INSTRUCTION = """You are a helpful stock market assistant.
 You have access to a tool called `get_stock_info` that can fetch real-time stock data.
 Use this tool when the user asks for current stock prices or information about a specific stock ticker.
-When using the tool, provide the ticker symbol (e.g., 'AAPL', 'GOOGL').
+When using the tool, provide the ticker symbols (e.g., 'AAPL', 'GOOGL'). Request every ticker you need in a single call.
 If you don't know something, just say so.
 Be concise and answer directly based on the information provided by the tool or your knowledge.
 """
 
+# How long fetched quotes, and answers built from them, are considered fresh
+QUOTE_TTL_SECONDS = 60
+# How old the local list of valid tickers may get before it is downloaded again
+TICKER_LIST_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
 # --- Streamlit App UI ---
 st.set_page_config(page_title=f"📈 {AGENT_NAME.replace('_', ' ').title()}", layout="centered")
 
@@ -28,182 +46,508 @@ st.title(f"📈 {AGENT_NAME.replace('_', ' ').title()}")
 st.markdown(f"*{AGENT_DESCRIPTION}*")
 st.markdown("---")
 
+@st.cache_resource
+def _env():
+    """Loads environment variables from the .env file once per process, not on every rerun."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.environ
+
 # Retrieve API key from environment variables
-api_key = os.getenv("GOOGLE_API_KEY")
+api_key = _env().get("GOOGLE_API_KEY")
 
 # Display a warning if API key is not found
 if not api_key:
     st.warning("Gemini API Key not found. Please create a .env file with GOOGLE_API_KEY=your_api_key, or set it as an environment variable.")
     st.markdown("Get your API key from [Google AI Studio](https://aistudio.google.com/app/apikey)")
 
+# --- Chat Transcript ---
+# Only the most recent messages are kept in session state and re-rendered on each rerun;
+# the full transcript lives on disk and is read only when the user asks for it.
+MAX_VISIBLE = 50
+TRANSCRIPT_DIR = Path(os.path.expanduser("~/.stockassistant"))
+# Transcripts untouched for this long belong to finished sessions and are deleted
+TRANSCRIPT_RETENTION_SECONDS = 24 * 60 * 60
+
+def _transcript_path(session_id: str) -> Path:
+    """Returns the transcript file (one message per line) for a session."""
+    return TRANSCRIPT_DIR / f"{session_id}.jsonl"
+
+def _prune_transcripts():
+    """Deletes transcripts past the retention period so conversations aren't kept on the server indefinitely."""
+    cutoff = time.time() - TRANSCRIPT_RETENTION_SECONDS
+    for path in TRANSCRIPT_DIR.glob("*.jsonl"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            # Another session pruned it first
+            pass
+
+def _save_message(role: str, content: str):
+    """Records a chat message in session state and appends it to the on-disk transcript."""
+    message = {"role": role, "content": content}
+    st.session_state.messages.append(message)
+    del st.session_state.messages[:-MAX_VISIBLE]
+    st.session_state.message_count += 1
+
+    TRANSCRIPT_DIR.mkdir(parents=True, exist_ok=True)
+    with _transcript_path(st.session_state.session_id).open("ab") as transcript:
+        transcript.write(orjson.dumps(message) + b"\n")
+
+def _load_messages(session_id: str, limit: int) -> list[dict]:
+    """
+    Reads the first `limit` messages of a session's transcript from disk.
+    Returns an empty list if the transcript has been pruned or was never written.
+    """
+    try:
+        with _transcript_path(session_id).open("rb") as transcript:
+            return [orjson.loads(line) for line, _ in zip(transcript, range(limit))]
+    except FileNotFoundError:
+        return []
+
+def _render_message(message: dict):
+    """Displays a single chat message."""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
 # Initialize chat history in session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+    # Clean up after finished sessions whenever a new one starts
+    _prune_transcripts()
+st.session_state.setdefault("message_count", 0)
+# Gemini-formatted conversation turns, resent as context on each call
+st.session_state.setdefault("gemini_history", [])
+# Recent answers to self-contained prompts, so an immediate repeat skips the Gemini round-trip
+st.session_state.setdefault("response_cache", cachetools.TTLCache(maxsize=256, ttl=QUOTE_TTL_SECONDS))
+
+# Older messages are only loaded from disk when the user opts in
+hidden_count = st.session_state.message_count - len(st.session_state.messages)
+if hidden_count > 0 and st.toggle("Show full history", key="show_full_history", help=f"{hidden_count} earlier messages"):
+    for message in _load_messages(st.session_state.session_id, hidden_count):
+        _render_message(message)
 
-# Display chat messages from history on app rerun
+# Display recent chat messages from history on app rerun
 for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+    _render_message(message)
 
 # --- Tool Function: Fetch Stock Info ---
-def get_stock_info(ticker: str) -> str:
+@st.cache_resource
+def _disk_cache() -> diskcache.Cache:
+    """Returns the persistent quote cache shared across sessions and app restarts."""
+    return diskcache.Cache(os.path.expanduser("~/.stockcache"))
+
+def _ticker(symbol: str) -> "yfinance.Ticker":
     """
-    Fetches real-time stock information for a given ticker symbol.
-    Args:
-        ticker (str): The stock ticker symbol (e.g., 'AAPL', 'GOOGL').
-    Returns:
-        str: A JSON string containing stock information or an error message.
+    Creates a yfinance Ticker object for a symbol.
+    A fresh object is built per lookup because yfinance memoizes fetched data on it, so a shared
+    one would keep serving its first quote; expiry is left to the caches around the lookups.
+    yfinance (and pandas behind it) is imported on first use to keep it off the cold-start path.
+    """
+    import yfinance as yf
+    return yf.Ticker(symbol)
+
+@st.cache_data(ttl=24 * 60 * 60, max_entries=512, show_spinner=False)
+def _profile(ticker: str) -> dict:
+    """
+    Looks up the slow-changing company details (name, share count) from the full Yahoo Finance info.
+    This is the heavy request, so it is cached for a day rather than per quote.
+    The share count covers the whole company, not just the quoted class (GOOGL, BRK-B, ...), so
+    multiplying it by the live price reproduces Yahoo's own market cap.
     """
+    info = _ticker(ticker).get_info()
+    shares = info.get("impliedSharesOutstanding")
+    if not shares and info.get("marketCap") and info.get("regularMarketPrice"):
+        shares = info["marketCap"] / info["regularMarketPrice"]
+    return {"longName": info.get("longName", "N/A"), "companyShares": shares}
+
+def _bar_value(value, cast=float):
+    """Converts a price bar value for the tool output, reporting missing (NaN) values as "N/A"."""
+    return "N/A" if math.isnan(value) else cast(value)
+
+def _download_quote(ticker: str) -> dict:
+    """
+    Fetches real-time quote data for a ticker symbol from Yahoo Finance.
+    Prices come from a single 5-day chart request: the bars give the day's open, high, low, volume and
+    the previous close, and the chart metadata gives the live price, currency and exchange.
+    Market cap and name come from `_profile`, so a cold lookup costs one chart request plus the full
+    info request, and later lookups within a day cost just the chart request.
+    """
+    stock = _ticker(ticker)
+    history = stock.history(period="5d")
+
+    if history.empty:
+        return {"error": f"Could not find information for ticker: {ticker}. Please check the symbol."}
+
+    # Already fetched with the chart above, so this doesn't make another request
+    meta = stock.get_history_metadata()
+    today = history.iloc[-1]
+    current_price = float(meta.get("regularMarketPrice") or today["Close"])
+    previous_close = _bar_value(history["Close"].iloc[-2]) if len(history) > 1 else meta.get("chartPreviousClose", "N/A")
+
+    try:
+        profile = _profile(ticker)
+    except Exception:
+        profile = {"longName": "N/A", "companyShares": None}
+    shares = profile["companyShares"]
+
+    return {
+        "ticker": ticker.upper(),
+        "longName": profile["longName"],
+        "currency": meta.get("currency", "N/A"),
+        "exchange": meta.get("exchangeName", "N/A"),
+        "currentPrice": current_price,
+        "previousClose": previous_close,
+        "open": _bar_value(today["Open"]),
+        "dayHigh": _bar_value(today["High"]),
+        "dayLow": _bar_value(today["Low"]),
+        "volume": _bar_value(today["Volume"], int),
+        "marketCap": round(current_price * shares) if shares else "N/A"
+    }
+
+def _load_ticker_list(state: dict):
+    """
+    Loads tickers.pkl into `state`, then rebuilds it with build_tickers.py when it is missing or older
+    than a week. Any failure leaves the stale list (or None) in place rather than raising.
+    """
+    path = build_tickers.OUTPUT_PATH
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-
-        if not info:
-            return json.dumps({"error": f"Could not find information for ticker: {ticker}. Please check the symbol."})
-
-        # Extract relevant real-time data
-        # Note: 'currentPrice' or 'regularMarketPrice' might not always be available instantly.
-        # 'previousClose' is often more reliable for recent data.
-        data = {
-            "ticker": ticker.upper(),
-            "longName": info.get("longName", "N/A"),
-            "currency": info.get("currency", "N/A"),
-            "exchange": info.get("exchange", "N/A"),
-            "currentPrice": info.get("currentPrice", info.get("regularMarketPrice", "N/A")),
-            "previousClose": info.get("previousClose", "N/A"),
-            "open": info.get("open", "N/A"),
-            "dayHigh": info.get("dayHigh", "N/A"),
-            "dayLow": info.get("dayLow", "N/A"),
-            "volume": info.get("volume", "N/A"),
-            "marketCap": info.get("marketCap", "N/A")
-        }
-        return json.dumps(data)
+        if path.exists():
+            state["tickers"] = pickle.loads(path.read_bytes())
     except Exception as e:
-        return json.dumps({"error": f"An error occurred while fetching data for {ticker}: {str(e)}"})
+        logger.warning("Could not read the ticker list: %s", e)
+    try:
+        if state["tickers"] is None or time.time() - path.stat().st_mtime > TICKER_LIST_MAX_AGE_SECONDS:
+            state["tickers"] = build_tickers.build(timeout=10)
+    except Exception as e:
+        logger.warning("Could not refresh the ticker list: %s", e)
+
+@st.cache_resource
+def _ticker_list_state() -> dict:
+    """Holds the process-wide ticker list, loading and refreshing it on a background thread."""
+    state = {"tickers": None}
+    threading.Thread(target=_load_ticker_list, args=(state,), daemon=True).start()
+    return state
+
+def _valid_tickers() -> frozenset | None:
+    """
+    Returns the set of US-listed ticker symbols without ever waiting on the network.
+    None while the list is still loading or unavailable, which disables local validation.
+    """
+    return _ticker_list_state()["tickers"]
+
+# Start loading the ticker list as soon as the app starts, so it is usually ready by the first question
+_ticker_list_state()
+
+@st.cache_data(ttl=QUOTE_TTL_SECONDS, show_spinner=False)
+def _fetch_info(ticker: str) -> dict:
+    """
+    Returns quote data for a ticker, checking the in-process and on-disk caches before the network.
+    The disk cache is keyed by time bucket so quotes survive app restarts but are at most two TTLs old.
+    """
+    if not is_known_ticker(ticker, _valid_tickers()):
+        return {"error": f"Unknown ticker {ticker}. Please check the symbol."}
+
+    key = f"{ticker.upper()}:{int(time.time() // QUOTE_TTL_SECONDS)}"
+    cache = _disk_cache()
+    if key in cache:
+        return cache[key]
+
+    data = _download_quote(ticker)
+    # A miss may be transient, so it must not outlive this process on disk
+    if "error" not in data:
+        cache.set(key, data, expire=2 * QUOTE_TTL_SECONDS)
+    return data
+
+def _prefetch(tickers: list[str]) -> dict[str, asyncio.Task]:
+    """
+    Starts fetching tickers in the background before anyone has asked for them.
+    Unused results are simply dropped, after still warming the quote caches.
+    """
+    tasks = {}
+    for ticker in tickers:
+        task = asyncio.create_task(asyncio.to_thread(_fetch_info, ticker))
+        # Retrieve any exception so an unused failed prefetch isn't reported as unhandled
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        tasks[ticker.upper()] = task
+    return tasks
+
+async def get_stock_info(tickers: list[str], prefetched: dict[str, asyncio.Task] | None = None) -> str:
+    """
+    Fetches real-time stock information for one or more ticker symbols.
+    Args:
+        tickers (list[str]): The stock ticker symbols (e.g., ['AAPL', 'GOOGL']).
+        prefetched (dict[str, asyncio.Task], optional): Lookups already in flight, keyed by uppercase symbol.
+    Returns:
+        str: A JSON string containing stock information or an error message for each ticker.
+    """
+    return orjson.dumps({"results": await fetch_many(_fetch_info, tickers, prefetched)}).decode()
 
 # --- Gemini API Tool Schema Definition ---
 # This describes the `get_stock_info` function to the LLM
 STOCK_INFO_TOOL_SCHEMA = {
     "name": "get_stock_info",
-    "description": "Fetches real-time stock information for a given ticker symbol. Returns current price, previous close, open, high, low, and volume.",
+    "description": "Fetches real-time stock information for one or more ticker symbols. Returns current price, previous close, open, high, low, and volume for each.",
     "parameters": {
         "type": "OBJECT",
         "properties": {
-            "ticker": {
-                "type": "STRING",
-                "description": "The stock ticker symbol (e.g., 'AAPL', 'GOOGL', 'MSFT')."
+            "tickers": {
+                "type": "ARRAY",
+                "items": {"type": "STRING"},
+                "description": "The stock ticker symbols (e.g., ['AAPL', 'GOOGL', 'MSFT'])."
             }
         },
-        "required": ["ticker"]
+        "required": ["tickers"]
     }
 }
 
+# Static parts of every Gemini request, serialized once at import; orjson splices the
+# pre-encoded bytes into each payload instead of walking the schema dicts again
+_TOOLS = orjson.Fragment(orjson.dumps([{"functionDeclarations": [STOCK_INFO_TOOL_SCHEMA]}]))
+_SYSTEM_INSTRUCTION = orjson.Fragment(orjson.dumps({"parts": [{"text": AGENT_INSTRUCTION}]}))
+
+@functools.lru_cache(maxsize=8)
+def _api_url(api_key: str) -> str:
+    """Builds the Gemini streaming endpoint URL for an API key."""
+    return f"https://generativelanguage.googleapis.com/v1beta/models/{AGENT_MODEL}:streamGenerateContent?alt=sse&key={api_key}"
+
+# --- Prompt Pre-filter ---
+# Most tickers fetched speculatively per prompt, so an all-caps message can't fan out into many lookups
+_MAX_PREFETCH = 3
+
+def _tool_turns(function_calls: list[dict], tool_outputs: list[str], lead_text: str = "") -> list[dict]:
+    """
+    Builds the model's function call turn and the matching tool result turn, with one
+    functionResponse per functionCall. Any text the model streamed before calling is echoed too.
+    """
+    model_parts = [{"text": lead_text}] if lead_text else []
+    # Echoing the LLM's function calls is crucial for it to understand its own previous turn
+    model_parts += [{"functionCall": function_call} for function_call in function_calls]
+    return [
+        {"role": "model", "parts": model_parts},
+        {"role": "function", "parts": [
+            {"functionResponse": {"name": function_call["name"], "response": orjson.loads(tool_output)}}
+            for function_call, tool_output in zip(function_calls, tool_outputs)
+        ]}
+    ]
+
+# --- HTTP Client for Gemini API calls ---
+@st.cache_resource
+def _aclient() -> httpx.AsyncClient:
+    """
+    Returns a shared async HTTP/2 client with a keep-alive connection pool.
+    It lives on the background event loop, so connections are reused across turns.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        timeout=30.0
+    )
+
+# --- Background Event Loop ---
+@st.cache_resource
+def _loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns a persistent event loop running in a daemon thread.
+    Keeping one loop alive lets the pooled HTTP client survive between turns and reruns.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+# Request bodies larger than this are sent gzip-compressed
+_GZIP_MIN_BYTES = 2048
+
 # --- Function to interact with the simulated agent (Gemini API) ---
-async def get_agent_response(prompt: str, api_key: str):
+def _remember(history: list, turns: list[dict], text: str):
+    """
+    Appends a completed exchange to the session's Gemini history: the user turn and any tool
+    turns, followed by the model's answer. Keeping the tool turns gives follow-ups the fetched data.
+    """
+    history.extend(turns)
+    history.append({"role": "model", "parts": [{"text": text}]})
+    # Every request resends the whole history, so keep it to the exchanges still on screen
+    trim_history(history, MAX_VISIBLE // 2)
+
+async def _stream_parts(client: httpx.AsyncClient, api_url: str, payload: dict):
+    """Posts a request to the Gemini streaming endpoint and yields each response part as it arrives."""
+    body = orjson.dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    # Long chat histories compress well; tiny payloads aren't worth the CPU
+    if len(body) > _GZIP_MIN_BYTES:
+        compressed = gzip.compress(body, compresslevel=3)
+        logger.debug("Gemini request body gzipped from %d to %d bytes", len(body), len(compressed))
+        body = compressed
+        headers["Content-Encoding"] = "gzip"
+    async with client.stream("POST", api_url, content=body, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            chunk = orjson.loads(line[6:])
+            # Walk candidates -> content -> parts once, tolerating any level being missing or empty
+            for part in ((chunk.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []:
+                yield part
+
+async def get_agent_response(prompt: str, api_key: str, history: list, notices: list):
     """
     Simulates the agent's response by calling the Gemini API with agent's instructions and tools.
-    Handles tool calls and returns the final response.
+    Handles tool calls and yields the final response text as it streams in.
+    Runs on the background event loop, so it must not call Streamlit directly: status messages are
+    appended to `notices` as (kind, message) pairs for the caller to render.
     """
     if not api_key:
-        return "Gemini API Key is missing. Please provide it to use the assistant."
-
-    # Initial prompt to the LLM with agent instruction and user query
-    # The agent instruction is sent as a user part to guide the model's behavior.
-    chat_history = [
-        {"role": "user", "parts": [{"text": AGENT_INSTRUCTION}]},
-        {"role": "user", "parts": [{"text": prompt}]}
-    ]
+        yield "Gemini API Key is missing. Please provide it to use the assistant."
+        return
 
+    # Prior turns from this session followed by the new user query
+    # The agent instruction is sent once as the system instruction rather than as a user turn.
+    user_turn = {"role": "user", "parts": [{"text": prompt}]}
+    chat_history = history + [user_turn]
     payload = {
         "contents": chat_history,
-        "tools": [
-            {"functionDeclarations": [STOCK_INFO_TOOL_SCHEMA]}
-        ]
+        "systemInstruction": _SYSTEM_INSTRUCTION
     }
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{AGENT_MODEL}:generateContent?key={api_key}"
+
+    tickers = find_tickers(prompt)
+    prefetched = {}
+    # Only offer the tool when the prompt looks stock related, so small talk never triggers a tool round-trip
+    # Follow-ups in a conversation that already fetched stock data keep the tool too
+    if tickers or mentions_any(prompt, STOCK_KEYWORDS) or has_stock_exchange(history):
+        payload["tools"] = _TOOLS
+    # For an obvious single-ticker price question, run the tool up front and attach its result,
+    # skipping the round-trip where the model would only ask for it. Only symbols confirmed by the
+    # loaded ticker list qualify, so a stray acronym never becomes a made-up tool call.
+    if len(tickers) == 1 and mentions_any(prompt, PRICE_KEYWORDS) and \
+       (valid_tickers := _valid_tickers()) is not None and is_listed(tickers[0], valid_tickers):
+        notices.append(("info", f"Fetching stock info for: {tickers[0]}"))
+        function_call = {"name": "get_stock_info", "args": {"tickers": tickers}}
+        chat_history.extend(_tool_turns([function_call], [await get_stock_info(tickers)]))
+    elif tickers:
+        # Otherwise speculatively fetch the likely tickers so the Yahoo round-trip overlaps the first
+        # Gemini call; if the model asks for them, their results are already waiting
+        prefetched = _prefetch(tickers[:_MAX_PREFETCH])
+
+    api_url = _api_url(api_key)
 
     try:
+        client = _aclient()
+        text = ""
+        function_calls = []
         # First call to LLM: User prompt + Tool definition
-        response = requests.post(api_url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
-
-        # Check if the LLM decided to call a tool
-        if result.get("candidates") and result["candidates"][0].get("content") and \
-           result["candidates"][0]["content"].get("parts") and \
-           result["candidates"][0]["content"]["parts"][0].get("functionCall"):
-
-            function_call = result["candidates"][0]["content"]["parts"][0]["functionCall"]
-            function_name = function_call["name"]
-            function_args = function_call["args"]
-
-            if function_name == "get_stock_info":
-                st.info(f"Agent wants to fetch stock info for: {function_args.get('ticker')}")
-                # Execute the local Python function
-                tool_output = get_stock_info(function_args.get("ticker"))
-
-                # Append the LLM's function call to history
-                # This is crucial for the LLM to understand its own previous turn
-                chat_history.append({
-                    "role": "model", # The model's turn
-                    "parts": [{"functionCall": function_call}] # The actual function call object
-                })
-
-                # Send the tool output back to the LLM for a final response
-                chat_history.append({
-                    "role": "function",
-                    "parts": [{"functionResponse": {"name": "get_stock_info", "response": json.loads(tool_output)}}]
-                })
-
-                # Second call to LLM: Original prompt + Model's function call + Tool output
-                payload_with_tool_output = {
-                    "contents": chat_history,
-                    "tools": [
-                        {"functionDeclarations": [STOCK_INFO_TOOL_SCHEMA]}
-                    ]
-                }
-                response_final = requests.post(api_url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload_with_tool_output))
-                response_final.raise_for_status()
-                result_final = response_final.json()
-
-                if result_final.get("candidates") and result_final["candidates"][0].get("content") and \
-                   result_final["candidates"][0]["content"].get("parts") and \
-                   result_final["candidates"][0]["content"]["parts"][0].get("text"):
-                    return result_final["candidates"][0]["content"]["parts"][0]["text"]
-                else:
-                    return "I received data from the stock tool, but couldn't formulate a clear response."
-            else:
-                return f"Agent tried to call an unknown function: {function_name}"
-        else:
-            # If no tool call, return the direct text response from the first LLM call
-            if result.get("candidates") and result["candidates"][0].get("content") and \
-               result["candidates"][0]["content"].get("parts") and \
-               result["candidates"][0]["content"]["parts"][0].get("text"):
-                return result["candidates"][0]["content"]["parts"][0]["text"]
-            else:
-                return "I couldn't get a clear response from the model. Please try again."
-
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error communicating with the Gemini API: {e}")
-        return f"I'm currently unable to provide a response due to a technical issue: {e}. Please ensure your API key is correct and has access to the '{AGENT_MODEL}' model."
+        # Tool calls arrive whole, one per part, so text can be streamed out until the first shows up
+        async for part in _stream_parts(client, api_url, payload):
+            if call := part.get("functionCall"):
+                function_calls.append(call)
+            elif (part_text := part.get("text")) and not function_calls:
+                text += part_text
+                yield part_text
+
+        # Check if the LLM decided to call a tool, possibly several times in parallel
+        if function_calls:
+            for function_call in function_calls:
+                if function_call["name"] != "get_stock_info":
+                    yield f"Agent tried to call an unknown function: {function_call['name']}"
+                    return
+
+            tickers = list(dict.fromkeys(
+                ticker for function_call in function_calls for ticker in function_call["args"].get("tickers", [])
+            ))
+            notices.append(("info", f"Agent wants to fetch stock info for: {', '.join(tickers)}"))
+            # Fetch every distinct ticker once, concurrently, then answer each call with its own subset
+            results = dict(zip(tickers, await fetch_many(_fetch_info, tickers, prefetched)))
+            tool_outputs = [
+                orjson.dumps({"results": [results[ticker] for ticker in function_call["args"].get("tickers", [])]}).decode()
+                for function_call in function_calls
+            ]
+
+            # Append the LLM's function calls (with any text it streamed first) and the tool outputs
+            # to history for a final response
+            chat_history.extend(_tool_turns(function_calls, tool_outputs, text))
+
+            # Second call to LLM: Original prompt + Model's function call + Tool output
+            payload_with_tool_output = {
+                "contents": chat_history,
+                "tools": _TOOLS,
+                "systemInstruction": _SYSTEM_INSTRUCTION
+            }
+            # The text streamed before the calls is already recorded in the function call turn
+            text = ""
+            async for part in _stream_parts(client, api_url, payload_with_tool_output):
+                if part_text := part.get("text"):
+                    text += part_text
+                    yield part_text
+
+            if not text:
+                yield "I received data from the stock tool, but couldn't formulate a clear response."
+                return
+        elif not text:
+            yield "I couldn't get a clear response from the model. Please try again."
+            return
+
+        _remember(history, chat_history[len(history):], text)
+
+    except httpx.HTTPError as e:
+        notices.append(("error", f"Error communicating with the Gemini API: {e}"))
+        yield f"I'm currently unable to provide a response due to a technical issue: {e}. Please ensure your API key is correct and has access to the '{AGENT_MODEL}' model."
     except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        return "An unexpected error occurred."
+        notices.append(("error", f"An unexpected error occurred: {e}"))
+        yield "An unexpected error occurred."
+
+def _drain(agen, notices: list):
+    """
+    Iterates an async generator on the background loop from the script thread.
+    Notices queued by the generator are rendered before the chunk that follows them.
+    """
+    try:
+        while True:
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(agen.__anext__(), _loop()).result()
+            except StopAsyncIteration:
+                chunk = None
+            for kind, message in notices:
+                getattr(st, kind)(message)
+            notices.clear()
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # If the script stops mid-stream (rerun or new message), close the generator on its own loop
+        # so its open HTTP stream is released now rather than whenever it gets garbage collected
+        asyncio.run_coroutine_threadsafe(agen.aclose(), _loop()).result()
 
 
 # Accept user input
 if prompt := st.chat_input("Ask me about the stock market... (e.g., 'What is the price of AAPL?')"):
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    _save_message("user", prompt)
     # Display user message in chat message container
     with st.chat_message("user"):
         st.markdown(prompt)
 
     # Get agent response
+    # Only self-contained prompts are cached: a follow-up like "what about its volume?" depends on the
+    # conversation, so the same text can need a different answer. Adding the conversation to the key
+    # instead would make every repeat miss, since each answer extends the history.
+    response_key = (prompt.strip().lower(), int(time.time() // QUOTE_TTL_SECONDS)) if is_self_contained(prompt) else None
+    history = st.session_state.gemini_history
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Call the async function synchronously for Streamlit's context
-            response = asyncio.run(get_agent_response(prompt, api_key))
+        if response_key and (response := st.session_state.response_cache.get(response_key)) is not None:
+            # Same question within the quote TTL: the tool data would be identical, so reuse the answer
             st.markdown(response)
+            _remember(history, [{"role": "user", "parts": [{"text": prompt}]}], response)
+        else:
+            # Stream the response from the persistent background loop as it is generated
+            notices = []
+            history_length = len(history)
+            response = st.write_stream(
+                _drain(get_agent_response(prompt, api_key, history, notices), notices)
+            )
+            # Only cache answers the model actually produced, never fallbacks or transient failures
+            if response_key and len(history) > history_length and "error" not in response.lower():
+                st.session_state.response_cache[response_key] = response
     # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": response})
+    _save_message("assistant", response)
@@ -0,0 +1,94 @@
+"""
+Streamlit-free helpers for the stock assistant: prompt pre-filtering, ticker validation and
+concurrent quote lookups. Kept separate from main.py so they can be imported and tested
+without running the app.
+"""
+import asyncio
+import re
+
+# Cheap checks that decide whether a prompt needs the stock tool before asking the model
+TICKER_RE = re.compile(r"\b[A-Z]{1,5}\b")
+WORD_RE = re.compile(r"[a-z]+")
+# Everyday capitalised words that are not meant as ticker symbols in a prompt
+NOT_TICKERS = frozenset({
+    "I", "A", "OK", "AM", "PM", "US", "USA", "UK", "EU", "USD", "EUR", "GBP", "JPY", "CEO", "CFO",
+    "CTO", "AI", "ETF", "ETFS", "EPS", "PE", "IPO", "GDP", "CPI", "FED", "SEC", "NYSE", "YTD", "ATH",
+    "EOD", "EST", "UTC", "API", "FAQ", "IMO", "TLDR", "FYI"
+})
+STOCK_KEYWORDS = frozenset({"price", "stock", "ticker", "quote", "shares", "market", "cap", "volume"})
+PRICE_KEYWORDS = frozenset({"price", "quote"})
+# Words that make a prompt lean on earlier turns ("what about its volume?")
+REFERRING_WORDS = frozenset({
+    "it", "its", "they", "them", "their", "that", "those", "this", "these", "same", "also",
+    "again", "else", "other", "others", "instead", "about", "compared", "vs", "versus"
+})
+
+
+def find_tickers(prompt: str) -> list[str]:
+    """Returns the distinct uppercase tokens in a prompt that look like ticker symbols."""
+    return [token for token in dict.fromkeys(TICKER_RE.findall(prompt)) if token not in NOT_TICKERS]
+
+
+def mentions_any(prompt: str, keywords: frozenset) -> bool:
+    """Checks whether any of the keywords appears as a word in the prompt."""
+    return not keywords.isdisjoint(WORD_RE.findall(prompt.lower()))
+
+
+def is_self_contained(prompt: str) -> bool:
+    """
+    Checks whether a prompt can be answered without the conversation so far: it names a ticker
+    and has no words referring back to earlier turns.
+    """
+    return bool(find_tickers(prompt)) and not mentions_any(prompt, REFERRING_WORDS)
+
+
+def is_listed(ticker: str, valid_tickers: frozenset) -> bool:
+    """Checks whether a symbol appears in the US listings."""
+    symbol = ticker.upper()
+    # Yahoo writes share classes as BRK-B where the NASDAQ listings use BRK.B
+    return symbol in valid_tickers or symbol.replace("-", ".") in valid_tickers
+
+
+def is_known_ticker(ticker: str, valid_tickers: frozenset | None) -> bool:
+    """
+    Checks a symbol against the local ticker list without touching the network.
+    Everything passes when no list is loaded, and symbols the US listings can't cover
+    (indices, currencies, foreign exchange suffixes) are let through.
+    """
+    if valid_tickers is None or is_listed(ticker, valid_tickers):
+        return True
+    return any(marker in ticker for marker in ".^=")
+
+
+def has_stock_exchange(history: list[dict]) -> bool:
+    """Checks whether an earlier turn in the conversation already used the stock tool."""
+    return any("functionCall" in part for turn in history for part in turn["parts"])
+
+
+def trim_history(history: list[dict], max_exchanges: int):
+    """
+    Drops the oldest exchanges of a Gemini history in place so at most `max_exchanges` remain.
+    Tool results use the "function" role, so every "user" turn opens a new exchange and cutting
+    there never separates a functionCall from its functionResponse.
+    """
+    starts = [index for index, turn in enumerate(history) if turn["role"] == "user"]
+    if len(starts) > max_exchanges:
+        del history[:starts[-max_exchanges]]
+
+
+async def fetch_many(fetch, tickers: list[str], prefetched: dict[str, asyncio.Task] | None = None) -> list[dict]:
+    """
+    Runs the blocking `fetch` for several tickers concurrently so N lookups cost roughly one round-trip.
+    Tickers already in flight in `prefetched` (keyed by uppercase symbol) are awaited rather than
+    fetched again, and a failure for one ticker is reported in its own entry.
+    """
+    prefetched = prefetched or {}
+    results = await asyncio.gather(
+        *(prefetched.get(ticker.upper()) or asyncio.to_thread(fetch, ticker) for ticker in tickers),
+        return_exceptions=True
+    )
+    return [
+        {"error": f"An error occurred while fetching data for {ticker}: {str(result)}"}
+        if isinstance(result, Exception) else result
+        for ticker, result in zip(tickers, results)
+    ]
@@ -0,0 +1,118 @@
+import asyncio
+
+from stock_tools import (
+    PRICE_KEYWORDS, STOCK_KEYWORDS, fetch_many, find_tickers, has_stock_exchange, is_known_ticker,
+    is_listed, is_self_contained, mentions_any, trim_history
+)
+
+VALID_TICKERS = frozenset({"AAPL", "MSFT", "BRK.B"})
+
+
+def test_find_tickers_skips_everyday_acronyms_and_duplicates():
+    assert find_tickers("Compare AAPL and MSFT, then AAPL again") == ["AAPL", "MSFT"]
+    assert find_tickers("What's the price of gold in USD?") == []
+    assert find_tickers("I think the CEO of A company said AI and IPO") == []
+
+
+def test_find_tickers_ignores_lowercase_words():
+    assert find_tickers("how is tesla doing?") == []
+
+
+def test_mentions_any_matches_whole_words_case_insensitively():
+    assert mentions_any("What is the PRICE of AAPL?", PRICE_KEYWORDS)
+    assert mentions_any("market cap please", STOCK_KEYWORDS)
+    assert not mentions_any("priceless advice", PRICE_KEYWORDS)
+    assert not mentions_any("hi there", STOCK_KEYWORDS)
+
+
+def test_is_self_contained_requires_a_ticker_and_no_back_references():
+    assert is_self_contained("What is the price of AAPL?")
+    assert not is_self_contained("what about its volume?")
+    assert not is_self_contained("And how does MSFT compare to that?")
+    assert not is_self_contained("hello there")
+
+
+def test_is_listed_normalizes_yahoo_share_classes():
+    assert is_listed("aapl", VALID_TICKERS)
+    assert is_listed("BRK-B", VALID_TICKERS)
+    assert not is_listed("USD", VALID_TICKERS)
+
+
+def test_is_known_ticker():
+    assert is_known_ticker("AAPL", VALID_TICKERS)
+    assert not is_known_ticker("ZZZZZ", VALID_TICKERS)
+    # Symbols outside the US listings are let through
+    assert is_known_ticker("RELIANCE.NS", VALID_TICKERS)
+    assert is_known_ticker("^GSPC", VALID_TICKERS)
+    assert is_known_ticker("EURUSD=X", VALID_TICKERS)
+    # Without a loaded list nothing is rejected
+    assert is_known_ticker("ZZZZZ", None)
+
+
+def test_has_stock_exchange():
+    history = [
+        {"role": "user", "parts": [{"text": "hi"}]},
+        {"role": "model", "parts": [{"text": "Hello!"}]},
+    ]
+    assert not has_stock_exchange(history)
+    history.append({"role": "model", "parts": [{"functionCall": {"name": "get_stock_info", "args": {}}}]})
+    assert has_stock_exchange(history)
+
+
+def _exchange(prompt, with_tool=False):
+    turns = [{"role": "user", "parts": [{"text": prompt}]}]
+    if with_tool:
+        turns += [
+            {"role": "model", "parts": [{"functionCall": {"name": "get_stock_info", "args": {"tickers": [prompt]}}}]},
+            {"role": "function", "parts": [{"functionResponse": {"name": "get_stock_info", "response": {}}}]},
+        ]
+    return turns + [{"role": "model", "parts": [{"text": f"answer to {prompt}"}]}]
+
+
+def test_trim_history_keeps_whole_recent_exchanges():
+    history = _exchange("AAPL", with_tool=True) + _exchange("hi") + _exchange("MSFT", with_tool=True)
+
+    trim_history(history, 2)
+
+    assert history == _exchange("hi") + _exchange("MSFT", with_tool=True)
+    assert history[0]["role"] == "user"
+
+
+def test_trim_history_leaves_short_histories_alone():
+    history = _exchange("AAPL", with_tool=True)
+
+    trim_history(history, 2)
+
+    assert history == _exchange("AAPL", with_tool=True)
+
+
+def test_fetch_many_maps_errors_per_ticker():
+    def fetch(ticker):
+        if ticker == "BAD":
+            raise RuntimeError("boom")
+        return {"ticker": ticker}
+
+    results = asyncio.run(fetch_many(fetch, ["AAPL", "BAD", "MSFT"]))
+
+    assert results == [
+        {"ticker": "AAPL"},
+        {"error": "An error occurred while fetching data for BAD: boom"},
+        {"ticker": "MSFT"},
+    ]
+
+
+def test_fetch_many_reuses_prefetched_tasks():
+    calls = []
+
+    def fetch(ticker):
+        calls.append(ticker)
+        return {"ticker": ticker}
+
+    async def run():
+        prefetched = {"AAPL": asyncio.create_task(asyncio.to_thread(fetch, "AAPL"))}
+        return await fetch_many(fetch, ["aapl", "MSFT"], prefetched)
+
+    results = asyncio.run(run())
+
+    assert results == [{"ticker": "AAPL"}, {"ticker": "MSFT"}]
+    assert sorted(calls) == ["AAPL", "MSFT"]